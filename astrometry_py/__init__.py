@@ -1,6 +1,39 @@
 # expose the main entry‐points at the package level
 from .exceptions import *
 
-# bring subpackages into one namespace
-from .core      import *
-from .storage   import *
\ No newline at end of file
+# subpackages are only imported when one of their names is first used,
+# so "import astrometry_py" does not pull in aiohttp, shelve & co.
+import importlib
+
+_LAZY = {
+    "AstrometryAPIClient": ".core",
+    "JobManager":          ".core",
+    "Priority":            ".core",
+    "Logger":              ".core.logging",
+    "Notifier":            ".core.logging",
+    "hash_cache":          ".storage",
+    "compute_key":         ".storage",
+    "ResultCache":         ".storage",
+    "ResultFile":          ".storage",
+    "rgb_view":            ".storage",
+    "SkyIndex":            ".storage",
+    "angular_separation":  ".storage",
+}
+_SUBPACKAGES = ("core", "storage", "ingest", "distributed", "cli")
+
+__all__ = ["AstrometryError", "SolveFailedError", *_LAZY]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    elif name in _SUBPACKAGES:
+        value = importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | set(_SUBPACKAGES))
\ No newline at end of file
@@ -0,0 +1,152 @@
+import os
+import sys
+import asyncio
+import logging
+import argparse
+
+
+def _add_client_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--api-key", default=os.environ.get("ASTROMETRY_API_KEY"),
+                        help="Astrometry.net API key (default: $ASTROMETRY_API_KEY)")
+    parser.add_argument("--base-url", default="https://nova.astrometry.net/api/",
+                        help="Base URL for the API")
+    parser.add_argument("--transport", choices=("aiohttp", "http2"), default="aiohttp",
+                        help="HTTP transport; http2 needs httpx[http2]")
+
+
+async def _ingest(args: argparse.Namespace) -> None:
+    from .ingest import DirectoryWatcher, IngestPipeline, ResultSink, MoveSink, JsonlSink
+    from .ingest.watcher import DEFAULT_PATTERNS
+    from .core import AstrometryAPIClient, JobManager
+
+    client = AstrometryAPIClient(args.api_key, base_url=args.base_url, transport=args.transport)
+    try:
+        await client.login()
+        manager = JobManager(client, max_concurrent_uploads=args.workers)
+        watcher = DirectoryWatcher(
+            args.directories,
+            patterns=args.pattern or DEFAULT_PATTERNS,
+            settle_time=args.settle_time,
+            poll_interval=args.poll_interval,
+            include_existing=args.existing,
+            use_inotify=False if args.poll else None
+        )
+        sinks = []
+        if args.output_dir:
+            sinks.append(ResultSink(client, args.output_dir, args.product or ["new_fits_file"]))
+        if args.done_dir:
+            sinks.append(MoveSink(args.done_dir))
+        if args.log_file:
+            sinks.append(JsonlSink(args.log_file))
+        pipeline = IngestPipeline(manager, watcher, sinks=sinks, workers=args.workers, queue_size=args.queue_size)
+        await pipeline.run()
+    finally:
+        await client.close()
+
+
+def _enqueue(args: argparse.Namespace) -> None:
+    from .distributed import SQLiteWorkQueue
+    from .core.scheduler import Priority
+
+    queue = SQLiteWorkQueue(args.queue)
+    for path in args.images:
+        item_id = queue.put(os.path.abspath(path), priority=Priority[args.priority.upper()], tenant=args.tenant)
+        logging.getLogger(__name__).info("Queued %s as item %d", path, item_id)
+
+
+async def _worker(args: argparse.Namespace) -> None:
+    from .distributed import SQLiteWorkQueue, QueueWorker
+    from .core import AstrometryAPIClient, JobManager
+
+    queue = SQLiteWorkQueue(args.queue, max_attempts=args.max_attempts)
+    clients = [AstrometryAPIClient(key, base_url=args.base_url, transport=args.transport) for key in args.api_key]
+    try:
+        await asyncio.gather(*(client.login() for client in clients))
+        managers = [JobManager(client) for client in clients]
+        worker = QueueWorker(queue, managers, concurrency=args.concurrency, lease_seconds=args.lease_seconds)
+        await worker.run(stop_when_empty=args.once)
+    finally:
+        for client in clients:
+            await client.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Builds the command line parser
+
+    :return: Parser for the ``astrometry-py`` command
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog="astrometry-py", description="Astrometry.net command line tools")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Enable debug logging")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Watch directories and solve every new frame")
+    _add_client_args(ingest)
+    ingest.add_argument("directories", nargs="+", help="Drop directories to watch")
+    ingest.add_argument("--pattern", action="append", help="Filename glob to accept (repeatable)")
+    ingest.add_argument("--workers", type=int, default=4, help="Frames solved concurrently")
+    ingest.add_argument("--queue-size", type=int, default=64, help="Frames buffered ahead of the workers")
+    ingest.add_argument("--settle-time", type=float, default=1.0, help="Seconds a file must be unchanged")
+    ingest.add_argument("--poll-interval", type=float, default=2.0, help="Scan interval in polling mode")
+    ingest.add_argument("--poll", action="store_true", help="Poll even if inotify is available")
+    ingest.add_argument("--existing", action="store_true", help="Also process files already present")
+    ingest.add_argument("--output-dir", help="Download solved products here")
+    ingest.add_argument("--product", action="append",
+                        help="Product to download, i.e. new_fits_file or wcs_file (repeatable)")
+    ingest.add_argument("--done-dir", help="Move processed frames here")
+    ingest.add_argument("--log-file", help="Append path/jobid records to this JSONL file")
+    ingest.set_defaults(func=_ingest)
+
+    enqueue = commands.add_parser("enqueue", help="Add images to a shared work queue")
+    enqueue.add_argument("queue", help="Path of the SQLite queue file")
+    enqueue.add_argument("images", nargs="+", help="Images to queue (paths must be valid on the workers)")
+    enqueue.add_argument("--priority", choices=("urgent", "normal", "bulk"), default="normal",
+                         help="Priority class of the images")
+    enqueue.add_argument("--tenant", default="default", help="Who the images are for (fair sharing)")
+    enqueue.set_defaults(func=_enqueue)
+
+    worker = commands.add_parser("worker", help="Solve images from a shared work queue")
+    worker.add_argument("queue", help="Path of the SQLite queue file")
+    worker.add_argument("--api-key", action="append",
+                        help="API key to use (repeatable; default: comma separated $ASTROMETRY_API_KEY)")
+    worker.add_argument("--base-url", default="https://nova.astrometry.net/api/", help="Base URL for the API")
+    worker.add_argument("--transport", choices=("aiohttp", "http2"), default="aiohttp",
+                        help="HTTP transport; http2 needs httpx[http2]")
+    worker.add_argument("--concurrency", type=int, default=4, help="Items processed at once")
+    worker.add_argument("--lease-seconds", type=float, default=600.0, help="Lease length")
+    worker.add_argument("--max-attempts", type=int, default=3, help="Attempts before an item is marked failed")
+    worker.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    worker.set_defaults(func=_worker)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Entry point of the ``astrometry-py`` console script
+
+    :param argv: Arguments, defaults to sys.argv[1:]
+    :type argv: list[str], optional
+    :return: Exit code
+    :rtype: int
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "worker" and not args.api_key:
+        args.api_key = [k for k in os.environ.get("ASTROMETRY_API_KEY", "").split(",") if k]
+    if hasattr(args, "api_key") and not args.api_key:
+        parser.error("an API key is required (--api-key or $ASTROMETRY_API_KEY)")
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)-8s %(name)s: %(message)s"
+    )
+    try:
+        result = args.func(args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,19 @@
-from .client   import AstrometryAPIClient
-# from .notifier import Notifier
-from .jobs     import JobManager
\ No newline at end of file
+import importlib
+
+_LAZY = {
+    "AstrometryAPIClient": ".client",
+    # "Notifier":          ".notifier",
+    "JobManager":          ".jobs",
+    "FairScheduler":       ".scheduler",
+    "Priority":            ".scheduler",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
\ No newline at end of file
@@ -1,10 +1,11 @@
-import aiohttp
 import asyncio
 import json
 import os
+import tempfile
 from typing import Any, Dict
 import logging
 from .logging import Logger, Notifier
+from .transport import Transport, make_transport
 
 class AstrometryAPIClient:
     """
@@ -14,13 +15,15 @@ class AstrometryAPIClient:
     :param base_url:          Base URL for the API
     :param notifier_channels: Optional Notifier bit-flags (e.g. Notifier.SLACK|Notifier.DISCORD)
     :param notifier_level:    Logging level at or above which notifications fire
+    :param transport:         HTTP transport, a Transport or "aiohttp"/"http2" (default "aiohttp")
     """
     def __init__(
         self,
         api_key: str,
         base_url: str = "https://nova.astrometry.net/api/",
         notifier_channels: int | None = None,
-        notifier_level: int = logging.ERROR
+        notifier_level: int = logging.ERROR,
+        transport: Transport | str = "aiohttp"
     ):
         self.logger = Logger(
             name="astrometry_client",
@@ -32,20 +35,10 @@ class AstrometryAPIClient:
 
         self.api_key = api_key
         self.base_url = base_url.rstrip("/") + "/"
+        # result files are served from the site root rather than under /api/
+        self.site_url = self.base_url[:-len("api/")] if self.base_url.endswith("/api/") else self.base_url
         self.session_id: str = ""
-        timeout = aiohttp.ClientTimeout(total=60)
-        self._session: aiohttp.ClientSession | None = None
-
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """Gets the current HTTP session
-
-        :return: Session
-        :rtype: aiohttp.ClientSession
-        """
-        if self._session is None or self._session.closed:
-            self.logger.debug("Creating new aiohttp session")
-            self._session = aiohttp.ClientSession()
-        return self._session
+        self.transport = make_transport(transport) if isinstance(transport, str) else transport
 
     async def login(self) -> Dict[str, Any]:
         """Logs in to the Astrometry.net API
@@ -57,45 +50,35 @@ class AstrometryAPIClient:
         payload = {"request-json": json.dumps({"apikey": self.api_key})}
         try:
             self.logger.debug("Logging in via %s", url)
-            sess = await self._get_session()
-            async with sess.post(url, data=payload) as resp:
-                resp.raise_for_status()
-                text = await resp.text()
-                data = json.loads(text)
-                self.session_id = data.get("session", "")
-                self.logger.info("Logged in, session_id=%s", self.session_id)
-                return data
+            data = json.loads(await self.transport.post(url, data=payload))
+            self.session_id = data.get("session", "")
+            self.logger.info("Logged in, session_id=%s", self.session_id)
+            return data
         except Exception as e:
             self.logger.error("Login failed: %s", e)
             if self.notifier:
                 self.notifier.error(f"Login failed: {e}")
             raise
 
-    async def submit_job(self, image_path: str) -> Dict[str, Any]:
+    async def submit_job(self, image_path: str, **hints: Any) -> Dict[str, Any]:
         """Sends a submission to the API
 
         :param image_path: Path to image ot be submitted
         :type image_path: str
+        :param hints: Extra solver settings merged into the request-json
+            (i.e. center_ra, center_dec, radius, scale_lower, scale_upper)
         :return: Submission data
         :rtype: Dict[str, Any]
         """
         url = self.base_url + "upload"
         self.logger.info("Submitting job for image %s", image_path)
         try:
-            sess = await self._get_session()
-            form = aiohttp.FormData()
-            form.add_field("request-json", json.dumps({"session": self.session_id}), content_type="text/plain")
-            form.add_field(
-                "file", open(image_path, "rb"),
-                filename=os.path.basename(image_path),
-                content_type="application/octet-stream"
-            )
-            async with sess.post(url, data=form) as resp:
-                resp.raise_for_status()
-                text = await resp.text()
-                data = json.loads(text)
-                self.logger.info("Submit response: %s", data)
-                return data
+            fields = {"request-json": json.dumps({"session": self.session_id, **hints})}
+            with open(image_path, "rb") as f:
+                files = {"file": (os.path.basename(image_path), f, "application/octet-stream")}
+                data = json.loads(await self.transport.post(url, data=fields, files=files))
+            self.logger.info("Submit response: %s", data)
+            return data
         except Exception as e:
             self.logger.error("Failed to submit job: %s", e)
             if self.notifier:
@@ -114,19 +97,36 @@ class AstrometryAPIClient:
         params = {"session": self.session_id}
         self.logger.debug("Checking status for submission %d", subid)
         try:
-            sess = await self._get_session()
-            async with sess.get(url, params=params) as resp:
-                resp.raise_for_status()
-                text = await resp.text()
-                data = json.loads(text)
-                self.logger.debug("Status response: %s", data)
-                return data
+            data = json.loads(await self.transport.get(url, params=params))
+            self.logger.debug("Status response: %s", data)
+            return data
         except Exception as e:
             self.logger.error("Status check failed for %d: %s", subid, e)
             if self.notifier:
                 self.notifier.error(f"Status check failed for {subid}: {e}")
             raise
 
+    async def get_job_status(self, jobid: int) -> Dict[str, Any]:
+        """Gets the status of a job with ID jobid
+
+        :param jobid: ID of the job to check
+        :type jobid: int
+        :return: Job status (i.e. {"status": "solving"|"success"|"failure"})
+        :rtype: Dict[str, Any]
+        """
+        url = f"{self.base_url}jobs/{jobid}"
+        params = {"session": self.session_id}
+        self.logger.debug("Checking status for job %d", jobid)
+        try:
+            data = json.loads(await self.transport.get(url, params=params))
+            self.logger.debug("Job status response: %s", data)
+            return data
+        except Exception as e:
+            self.logger.error("Job status check failed for %d: %s", jobid, e)
+            if self.notifier:
+                self.notifier.error(f"Job status check failed for {jobid}: {e}")
+            raise
+
     async def get_job_info(self, jobid: int) -> Dict[str, Any]:
         """Gets info about a job with ID jobid
 
@@ -139,19 +139,36 @@ class AstrometryAPIClient:
         params = {"session": self.session_id}
         self.logger.debug("Fetching job info for job %d", jobid)
         try:
-            sess = await self._get_session()
-            async with sess.get(url, params=params) as resp:
-                resp.raise_for_status()
-                text = await resp.text()
-                data = json.loads(text)
-                self.logger.info("Job info retrieved for %d", jobid)
-                return data
+            data = json.loads(await self.transport.get(url, params=params))
+            self.logger.info("Job info retrieved for %d", jobid)
+            return data
         except Exception as e:
             self.logger.error("Failed to get job info %d: %s", jobid, e)
             if self.notifier:
                 self.notifier.error(f"Get job info failed for {jobid}: {e}")
             raise
 
+    async def get_job_annotations(self, jobid: int) -> list:
+        """Gets the objects annotated in the field of a job with ID jobid
+
+        :param jobid: ID of the job
+        :type jobid: int
+        :return: Annotations (names, pixelx, pixely, radius, ...)
+        :rtype: list
+        """
+        url = f"{self.base_url}jobs/{jobid}/annotations/"
+        params = {"session": self.session_id}
+        self.logger.debug("Fetching annotations for job %d", jobid)
+        try:
+            data = json.loads(await self.transport.get(url, params=params))
+            self.logger.info("Annotations retrieved for %d", jobid)
+            return data.get("annotations", [])
+        except Exception as e:
+            self.logger.error("Failed to get annotations %d: %s", jobid, e)
+            if self.notifier:
+                self.notifier.error(f"Get annotations failed for {jobid}: {e}")
+            raise
+
     async def retrieve_result(self, jobid: int, file_type: str) -> bytes:
         """Can retrieve various files based on the solved submission
 
@@ -162,26 +179,54 @@ class AstrometryAPIClient:
         :return: Raw file data
         :rtype: bytes
         """
-        url = f"https://nova.astrometry.net/{file_type}/{jobid}"
+        url = f"{self.site_url}{file_type}/{jobid}"
         params = {"session": self.session_id}
         self.logger.debug("Retrieving result %s for job %d", file_type, jobid)
         try:
-            sess = await self._get_session()
-            async with sess.get(url, params=params) as resp:
-                resp.raise_for_status()
-                data = await resp.read()
-                self.logger.info("Result %s retrieved for job %d", file_type, jobid)
-                return data
+            data = await self.transport.get(url, params=params)
+            self.logger.info("Result %s retrieved for job %d", file_type, jobid)
+            return data
         except Exception as e:
             self.logger.error("Result retrieval failed %s for %d: %s", file_type, jobid, e)
             if self.notifier:
                 self.notifier.error(f"Retrieve result {file_type} failed for {jobid}: {e}")
             raise
 
+    async def download_result(self, jobid: int, file_type: str, dest_path: str) -> str:
+        """Streams a result file straight to disk instead of buffering it in memory
+
+        :param jobid: ID of the job to retrieve
+        :type jobid: int
+        :param file_type: type of file (i.e. new_fits_file)
+        :type file_type: str
+        :param dest_path: Where to write the file
+        :type dest_path: str
+        :return: Path of the written file
+        :rtype: str
+        """
+        url = f"{self.site_url}{file_type}/{jobid}"
+        params = {"session": self.session_id}
+        # a unique temporary name, so concurrent downloads to the same path never share a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path) or ".",
+                                        prefix=os.path.basename(dest_path) + ".", suffix=".part")
+        os.close(fd)
+        self.logger.debug("Downloading result %s for job %d to %s", file_type, jobid, dest_path)
+        try:
+            await self.transport.download(url, tmp_path, params=params)
+            os.replace(tmp_path, dest_path)
+            self.logger.info("Result %s for job %d saved to %s", file_type, jobid, dest_path)
+            return dest_path
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.logger.error("Result download failed %s for %d: %s", file_type, jobid, e)
+            if self.notifier:
+                self.notifier.error(f"Download result {file_type} failed for {jobid}: {e}")
+            raise
+
     async def close(self) -> None:
         """Closes the HTTP session
         """
         self.logger.debug("Closing HTTP session")
-        if self._session:
-            await self._session.close()
-            self.logger.info("Session closed")
+        await self.transport.close()
+        self.logger.info("Session closed")
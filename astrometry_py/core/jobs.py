@@ -1,36 +1,131 @@
 # jobs.py
 import asyncio
+import functools
+import math
+import os
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List
 from .client import AstrometryAPIClient
-from ..exceptions import AstrometryError
+from .scheduler import FairScheduler, Priority
+from ..exceptions import AstrometryError, SolveFailedError
 # from .notifier import send_slack_notification
 from .logging import Notifier, Logger
-from ..storage import hash_cache
+from ..storage import hash_cache, SkyIndex
 
 class JobManager:
     """Submits jobs asynchronously to astrometry.net and monitors them
     """
-    def __init__(self, client: AstrometryAPIClient):
+    def __init__(
+        self,
+        client: AstrometryAPIClient,
+        sky_index: SkyIndex | None = None,
+        cpu_executor: Executor | None = None,
+        preprocess: Callable[[str], str] | None = None,
+        max_pending_cpu: int | None = None,
+        max_concurrent_uploads: int = 4,
+        class_limits: Dict[int, int] | None = None
+    ):
         """Initializes a JobManager object
 
+        CPU-bound stages (hashing for the cache and ``preprocess``) run on
+        ``cpu_executor`` while uploads and polling stay on the event loop.
+        At most ``max_pending_cpu`` of them run at once. A job only gives up
+        its preprocessing slot once it holds an upload slot, so
+        preprocessing can never run more than ``max_pending_cpu`` frames
+        ahead of the network.
+
+        Both stages are handed out by priority class and, within a class,
+        round-robin per tenant: queued work that has not been uploaded yet
+        is overtaken by anything more urgent that arrives later.
+        ``class_limits`` caps uploads per class, and the same share of the
+        CPU slots (always leaving one free), so a capped class cannot park
+        on every CPU slot while it waits for its uploads.
+
         :param client: the client that manages requests to the API
         :type client: AstrometryAPIClient
+        :param sky_index: index of previous solutions used to seed repeat fields; each solved job's
+            calibration summary (not its WCS) is added to it, defaults to None
+        :type sky_index: SkyIndex, optional
+        :param cpu_executor: process or thread pool for CPU-bound work; None uses the loop's default thread pool
+        :type cpu_executor: concurrent.futures.Executor, optional
+        :param preprocess: picklable function mapping an image path to the path to upload, defaults to None
+        :type preprocess: Callable[[str], str], optional
+        :param max_pending_cpu: frames allowed in or waiting after the CPU stage, defaults to os.cpu_count()
+        :type max_pending_cpu: int, optional
+        :param max_concurrent_uploads: simultaneous uploads, defaults to 4
+        :type max_concurrent_uploads: int, optional
+        :param class_limits: maximum simultaneous uploads per priority class (i.e. {Priority.BULK: 3}), defaults to None
+        :type class_limits: Dict[int, int], optional
         """
         self.client = client
+        self.sky_index = sky_index
+        self.cpu_executor = cpu_executor
+        self.preprocess = preprocess
+        cpu_capacity = max_pending_cpu or os.cpu_count() or 1
+        self._cpu_slots = FairScheduler(cpu_capacity, {
+            p: max(1, min(cpu_capacity - 1, math.ceil(n * cpu_capacity / max_concurrent_uploads)))
+            for p, n in (class_limits or {}).items()
+        })
+        self._upload_slots = FairScheduler(max_concurrent_uploads, class_limits)
         self._killed = False
         self.notifier = Notifier(Notifier.SLACK | Notifier.DISCORD)
         self.logger = Logger(name="astrometry_py")
 
-    @hash_cache
-    async def process_job(self, image_path: str) -> int:
+    @hash_cache(
+        cache_errors=(SolveFailedError,),
+        # cache keys are hashed on the CPU stage, in the job's priority class
+        hash_runner=lambda call: functools.partial(
+            call["self"].run_cpu, priority=call["priority"], tenant=call["tenant"]
+        )
+    )
+    async def process_job(
+        self,
+        image_path: str,
+        ra: float | None = None,
+        dec: float | None = None,
+        priority: int = Priority.NORMAL,
+        tenant: str = "default"
+    ) -> int:
         """Submits a job a monitors it till completion
 
+        If a sky index is configured and an approximate pointing is given,
+        the nearest prior solution is sent along as solver hints.
+
         :param image_path: Path to the image to submit
         :type image_path: str
+        :param ra: Approximate right ascension of the frame in degrees, defaults to None
+        :type ra: float, optional
+        :param dec: Approximate declination of the frame in degrees, defaults to None
+        :type dec: float, optional
+        :param priority: priority class of the job, defaults to Priority.NORMAL
+        :type priority: int, optional
+        :param tenant: who the job is for, used for fair sharing within a class, defaults to "default"
+        :type tenant: str, optional
+        :raises SolveFailedError: if astrometry.net could not solve the image (cached for a while)
         :raises AstrometryError: 
         :return: Job ID
         :rtype: int
         """
-        submit_resp = await self.client.submit_job(image_path)
+        hints = {}
+        if self.sky_index is not None and ra is not None and dec is not None:
+            prior = self.sky_index.nearest(ra, dec)
+            if prior:
+                self.logger.info(f"Seeding {image_path} with prior solution from job {prior['jobid']}")
+                hints = SkyIndex.hints(prior)
+
+        if self.preprocess is not None:
+            await self._cpu_slots.acquire(priority, tenant)
+            try:
+                image_path = await self._execute(self.preprocess, image_path)
+                await self._upload_slots.acquire(priority, tenant)
+            finally:
+                self._cpu_slots.release(priority)
+        else:
+            await self._upload_slots.acquire(priority, tenant)
+        try:
+            submit_resp = await self.client.submit_job(image_path, **hints)
+        finally:
+            self._upload_slots.release(priority)
         subid = submit_resp.get("subid")
         # print(subid)
         if not subid:
@@ -52,6 +147,10 @@ class JobManager:
                 # todo: figure out which job id is the "real" one (is it in job calibrations or jobs, is it first or last?)
                 jobid = status.get("jobs")[0]
                 job_results = await self.client.get_job_info(jobid)
+                calibration = job_results.get("calibration")
+                if self.sky_index is not None and calibration:
+                    # only the calibration summary is indexed, fetching the WCS would cost a download per job
+                    await asyncio.to_thread(self.sky_index.add, jobid, calibration)
 
                 # send_slack_notification(
                 #     f"Job {jobid} in submission {subid} detected the following:\n\t{job_results.get("machine_tags")}",
@@ -59,10 +158,75 @@ class JobManager:
                 # )
                 
                 return jobid
+
+            # no calibration yet; a job that already finished means the solver gave up
+            jobs = [j for j in status.get("jobs") or [] if j]
+            if jobs:
+                job_status = await self.client.get_job_status(jobs[0])
+                if job_status.get("status") == "failure":
+                    self.logger.warning(f"Submission {subid} could not be solved (job {jobs[0]})")
+                    raise SolveFailedError(f"Job {jobs[0]} in submission {subid} failed to solve.")
             await asyncio.sleep(2)
 
         raise AstrometryError(f"Job {subid} was killed.")
 
+    async def _execute(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_executor, fn, *args)
+
+    async def run_cpu(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        priority: int = Priority.NORMAL,
+        tenant: str = "default"
+    ) -> Any:
+        """Runs a CPU-bound function on the CPU executor once a CPU slot is free
+
+        process_job hashes its cache key through this, so keys are computed
+        under the same bound and priority order as preprocessing.
+
+        :param fn: Function to run (must be picklable for a process pool)
+        :type fn: Callable[..., Any]
+        :param priority: priority class of the work, defaults to Priority.NORMAL
+        :type priority: int, optional
+        :param tenant: who the work is for, defaults to "default"
+        :type tenant: str, optional
+        :return: Whatever fn returns
+        :rtype: Any
+        """
+        async with self._cpu_slots.slot(priority, tenant):
+            return await self._execute(fn, *args)
+
+    async def process_jobs(
+        self,
+        image_paths: Iterable[str],
+        priority: int = Priority.NORMAL,
+        tenant: str = "default"
+    ) -> List[int | BaseException]:
+        """Processes many images concurrently
+
+        :param image_paths: Paths to the images to submit
+        :type image_paths: Iterable[str]
+        :param priority: priority class of the jobs, defaults to Priority.NORMAL
+        :type priority: int, optional
+        :param tenant: who the jobs are for, defaults to "default"
+        :type tenant: str, optional
+        :return: Job IDs, or the exception raised for that image
+        :rtype: List[int | BaseException]
+        """
+        return await asyncio.gather(
+            *(self.process_job(path, priority=priority, tenant=tenant) for path in image_paths),
+            return_exceptions=True
+        )
+
+    def queue_stats(self) -> Dict[str, Dict[str, Dict[int, int]]]:
+        """Gets active and waiting jobs per priority class for both stages
+
+        :return: {"cpu": {...}, "upload": {...}} as returned by FairScheduler.stats
+        :rtype: Dict[str, Dict[str, Dict[int, int]]]
+        """
+        return {"cpu": self._cpu_slots.stats(), "upload": self._upload_slots.stats()}
+
     def kill(self) -> None:
         """Kills the job
         """
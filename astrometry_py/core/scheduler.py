@@ -0,0 +1,129 @@
+import enum
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict
+
+
+class Priority(enum.IntEnum):
+    """Priority classes; lower values are served first"""
+    URGENT = 0
+    NORMAL = 1
+    BULK = 2
+
+
+class FairScheduler:
+    """Hands out a fixed number of slots by priority class and tenant.
+
+    Waiters of a more urgent class are always served before less urgent
+    ones, however long those have been queued. Within a class, tenants are
+    served round-robin so one tenant's backlog cannot starve the others.
+    ``class_limits`` caps how many slots a class may hold at once, which
+    keeps headroom free for urgent work while bulk work is saturating.
+    """
+    def __init__(self, capacity: int, class_limits: Dict[int, int] | None = None):
+        """Initializes the scheduler
+
+        :param capacity: Total number of slots
+        :type capacity: int
+        :param class_limits: Maximum slots per priority class, defaults to None (no caps)
+        :type class_limits: Dict[int, int], optional
+        """
+        self.capacity = capacity
+        self.class_limits = dict(class_limits or {})
+        self._active = 0
+        self._active_by_class: Dict[int, int] = {}
+        # priority -> tenant -> waiting futures, tenants kept in round-robin order
+        self._waiting: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+
+    def _dispatch(self) -> None:
+        while self._active < self.capacity:
+            for priority in sorted(self._waiting):
+                limit = self.class_limits.get(priority)
+                if limit is None or self._active_by_class.get(priority, 0) < limit:
+                    break
+            else:
+                return
+
+            tenants = self._waiting[priority]
+            tenant, waiters = next(iter(tenants.items()))
+            fut = waiters.popleft()
+            if waiters:
+                tenants.move_to_end(tenant)
+            else:
+                del tenants[tenant]
+            if not tenants:
+                del self._waiting[priority]
+            if fut.done():
+                continue
+
+            fut.set_result(None)
+            self._active += 1
+            self._active_by_class[priority] = self._active_by_class.get(priority, 0) + 1
+
+    def _forget(self, priority: int, tenant: str, fut: asyncio.Future) -> None:
+        tenants = self._waiting.get(priority)
+        if tenants and tenant in tenants:
+            with contextlib.suppress(ValueError):
+                tenants[tenant].remove(fut)
+            if not tenants[tenant]:
+                del tenants[tenant]
+            if not tenants:
+                del self._waiting[priority]
+
+    async def acquire(self, priority: int = Priority.NORMAL, tenant: str = "default") -> None:
+        """Waits for a slot
+
+        :param priority: Priority class, defaults to Priority.NORMAL
+        :type priority: int, optional
+        :param tenant: Tenant the work belongs to, defaults to "default"
+        :type tenant: str, optional
+        """
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(priority, OrderedDict()).setdefault(tenant, deque()).append(fut)
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was granted just before the cancellation arrived
+                self.release(priority)
+            else:
+                self._forget(priority, tenant, fut)
+            raise
+
+    def release(self, priority: int = Priority.NORMAL) -> None:
+        """Gives a slot back
+
+        :param priority: Priority class the slot was acquired with, defaults to Priority.NORMAL
+        :type priority: int, optional
+        """
+        self._active -= 1
+        self._active_by_class[priority] -= 1
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = Priority.NORMAL, tenant: str = "default") -> AsyncIterator[None]:
+        """Holds a slot for the duration of an ``async with`` block
+
+        :param priority: Priority class, defaults to Priority.NORMAL
+        :type priority: int, optional
+        :param tenant: Tenant the work belongs to, defaults to "default"
+        :type tenant: str, optional
+        """
+        await self.acquire(priority, tenant)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def stats(self) -> Dict[str, Dict[int, int]]:
+        """Gets the number of active and waiting requests per priority class
+
+        :return: {"active": {priority: n}, "waiting": {priority: n}}
+        :rtype: Dict[str, Dict[int, int]]
+        """
+        return {
+            "active": {p: n for p, n in self._active_by_class.items() if n},
+            "waiting": {p: sum(len(w) for w in t.values()) for p, t in self._waiting.items()},
+        }
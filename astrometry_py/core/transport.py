@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+import aiohttp
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# field name -> (filename, file object, content type)
+Files = Dict[str, Tuple[str, BinaryIO, str]]
+
+
+class Transport(ABC):
+    """HTTP layer used by AstrometryAPIClient.
+
+    Implementations only move bytes; every method raises on a non-2xx
+    response so the client can keep its own logging and error handling.
+    """
+    @abstractmethod
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+        """Sends a GET request
+
+        :param url: URL to fetch
+        :type url: str
+        :param params: Query parameters, defaults to None
+        :type params: Dict[str, Any], optional
+        :return: Response body
+        :rtype: bytes
+        """
+
+    @abstractmethod
+    async def post(self, url: str, data: Optional[Dict[str, str]] = None, files: Optional[Files] = None) -> bytes:
+        """Sends a POST request, form-encoded or multipart if files are given
+
+        :param url: URL to post to
+        :type url: str
+        :param data: Form fields, defaults to None
+        :type data: Dict[str, str], optional
+        :param files: File fields as (filename, file object, content type), defaults to None
+        :type files: Files, optional
+        :return: Response body
+        :rtype: bytes
+        """
+
+    @abstractmethod
+    async def download(self, url: str, dest_path: str, params: Optional[Dict[str, Any]] = None,
+                       chunk_size: int = 1 << 20) -> None:
+        """Streams a GET response into a file
+
+        :param url: URL to fetch
+        :type url: str
+        :param dest_path: File to write
+        :type dest_path: str
+        :param params: Query parameters, defaults to None
+        :type params: Dict[str, Any], optional
+        :param chunk_size: Bytes per write, defaults to 1 MiB
+        :type chunk_size: int, optional
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Releases all connections; the transport reconnects if it is used again
+        """
+
+
+class AiohttpTransport(Transport):
+    """Default transport: HTTP/1.1 over a pooled aiohttp session
+    """
+    def __init__(self, timeout: float = 300.0, connect_timeout: float = 30.0, limit: int = 100):
+        """Initializes the transport
+
+        The defaults match ``aiohttp.ClientTimeout()``, so a stalled server
+        never hangs a request forever.
+
+        :param timeout: Total timeout per request in seconds, defaults to 300.0
+        :type timeout: float, optional
+        :param connect_timeout: Timeout for opening a connection in seconds, defaults to 30.0
+        :type connect_timeout: float, optional
+        :param limit: Maximum number of pooled connections, defaults to 100
+        :type limit: int, optional
+        """
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout)
+        self.limit = limit
+        self._session: aiohttp.ClientSession | None = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Gets the current HTTP session
+
+        :return: Session
+        :rtype: aiohttp.ClientSession
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout, connector=aiohttp.TCPConnector(limit=self.limit)
+            )
+        return self._session
+
+    async def get(self, url, params=None):
+        sess = await self._get_session()
+        async with sess.get(url, params=params) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def post(self, url, data=None, files=None):
+        sess = await self._get_session()
+        body: Any = data
+        if files:
+            body = aiohttp.FormData()
+            for name, value in (data or {}).items():
+                body.add_field(name, value, content_type="text/plain")
+            for name, (filename, fileobj, content_type) in files.items():
+                body.add_field(name, fileobj, filename=filename, content_type=content_type)
+        async with sess.post(url, data=body) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def download(self, url, dest_path, params=None, chunk_size=1 << 20):
+        sess = await self._get_session()
+        async with sess.get(url, params=params) as resp:
+            resp.raise_for_status()
+            with open(dest_path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+
+
+class HTTPXTransport(Transport):
+    """HTTP/2 transport built on httpx (``pip install httpx[http2]``).
+
+    All requests to a host are multiplexed as streams over one connection,
+    which keeps the socket and TLS cost of polling many submissions flat.
+    """
+    def __init__(
+        self,
+        http2: bool = True,
+        timeout: float = 300.0,
+        connect_timeout: float = 30.0,
+        max_connections: int = 10
+    ):
+        """Initializes the transport
+
+        :param http2: Negotiate HTTP/2 when the server supports it, defaults to True
+        :type http2: bool, optional
+        :param timeout: Timeout for each read, write or pool wait in seconds, defaults to 300.0
+        :type timeout: float, optional
+        :param connect_timeout: Timeout for opening a connection in seconds, defaults to 30.0
+        :type connect_timeout: float, optional
+        :param max_connections: Maximum number of open connections, defaults to 10
+        :type max_connections: int, optional
+        :raises RuntimeError: if httpx is not installed
+        """
+        if httpx is None:
+            raise RuntimeError("HTTPXTransport requires the httpx package (pip install httpx[http2])")
+        self.http2 = http2
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections)
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Gets the current HTTP client
+
+        :return: Client
+        :rtype: httpx.AsyncClient
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2, timeout=self.timeout, limits=self.limits, follow_redirects=True
+            )
+        return self._client
+
+    async def get(self, url, params=None):
+        resp = await self._get_client().get(url, params=params)
+        resp.raise_for_status()
+        return resp.content
+
+    async def post(self, url, data=None, files=None):
+        resp = await self._get_client().post(url, data=data, files=files)
+        resp.raise_for_status()
+        return resp.content
+
+    async def download(self, url, dest_path, params=None, chunk_size=1 << 20):
+        async with self._get_client().stream("GET", url, params=params) as resp:
+            resp.raise_for_status()
+            with open(dest_path, "wb") as f:
+                async for chunk in resp.aiter_bytes(chunk_size):
+                    f.write(chunk)
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+
+
+def make_transport(name: str = "aiohttp", **kwargs: Any) -> Transport:
+    """Creates a transport by name
+
+    :param name: "aiohttp" (HTTP/1.1) or "http2" (httpx), defaults to "aiohttp"
+    :type name: str, optional
+    :raises ValueError: for an unknown name
+    :return: The transport
+    :rtype: Transport
+    """
+    if name == "aiohttp":
+        return AiohttpTransport(**kwargs)
+    if name in ("http2", "httpx"):
+        return HTTPXTransport(**kwargs)
+    raise ValueError(f"Unknown transport {name!r}")
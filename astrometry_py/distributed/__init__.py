@@ -0,0 +1,2 @@
+from .queue  import SQLiteWorkQueue, WorkItem
+from .worker import QueueWorker
\ No newline at end of file
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from ..core.scheduler import Priority
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = ("""
+CREATE TABLE IF NOT EXISTS items (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    path          TEXT    NOT NULL,
+    params        TEXT    NOT NULL DEFAULT '{}',
+    priority      INTEGER NOT NULL DEFAULT 1,
+    state         TEXT    NOT NULL DEFAULT 'queued',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    jobid         INTEGER,
+    error         TEXT,
+    created       REAL    NOT NULL,
+    updated       REAL    NOT NULL
+)""",
+    "CREATE INDEX IF NOT EXISTS items_ready ON items (state, priority, id)",
+)
+
+
+@dataclass
+class WorkItem:
+    """A leased image reference"""
+    id: int
+    path: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    priority: int = Priority.NORMAL
+    attempts: int = 0
+
+
+class SQLiteWorkQueue:
+    """Work queue stored in a single SQLite file.
+
+    Producers :meth:`put` image paths, workers :meth:`lease` them for a
+    limited time and then :meth:`ack`, :meth:`nack` (retry) or :meth:`fail`
+    (give up) them. A lease that is neither renewed nor acknowledged expires
+    and the item goes back to other workers, so a crashed host never loses
+    frames.
+
+    The file can live on a shared (i.e. NFS) mount: every state change is a
+    short ``BEGIN IMMEDIATE`` transaction and the rollback journal is used
+    instead of WAL, which needs shared memory between hosts. Items are leased
+    in :class:`Priority` order (lower values first), then in arrival order.
+    """
+    def __init__(self, path: str, max_attempts: int = 3, timeout: float = 30.0):
+        """Opens (and if needed creates) the queue
+
+        :param path: SQLite database file
+        :type path: str
+        :param max_attempts: Leases an item gets before it is marked failed, defaults to 3
+        :type max_attempts: int, optional
+        :param timeout: Seconds to wait for the database lock, defaults to 30.0
+        :type timeout: float, optional
+        """
+        self.path = os.path.expanduser(path)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self) -> "_Transaction":
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        return _Transaction(conn)
+
+    def put(self, path: str, priority: int = Priority.NORMAL, **params: Any) -> int:
+        """Adds an image reference to the queue
+
+        :param path: Image path as seen by the workers
+        :type path: str
+        :param priority: Lower values are leased first, defaults to Priority.NORMAL
+        :type priority: int, optional
+        :param params: Extra keyword arguments for ``JobManager.process_job`` (i.e. ra, dec, tenant)
+        :return: Item ID
+        :rtype: int
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO items (path, params, priority, created, updated) VALUES (?, ?, ?, ?, ?)",
+                (path, json.dumps(params), int(priority), now, now)
+            )
+            return cur.lastrowid
+
+    def lease(self, owner: str, lease_seconds: float = 600.0) -> Optional[WorkItem]:
+        """Takes the next item, or an item whose lease has expired
+
+        :param owner: Identifier of the leasing worker
+        :type owner: str
+        :param lease_seconds: How long the lease lasts unless renewed, defaults to 600.0
+        :type lease_seconds: float, optional
+        :return: The leased item, or None if nothing is ready
+        :rtype: Optional[WorkItem]
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE items SET state = 'failed', error = 'lease expired too often', updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id, path, params, priority, attempts FROM items "
+                "WHERE state = 'queued' OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY priority, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE items SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE id = ?",
+                (owner, now + lease_seconds, now, row[0])
+            )
+        return WorkItem(id=row[0], path=row[1], params=json.loads(row[2]), priority=row[3], attempts=row[4] + 1)
+
+    def renew(self, item_id: int, owner: str, lease_seconds: float = 600.0) -> bool:
+        """Extends a lease that is still held
+
+        :param item_id: ID of the item
+        :type item_id: int
+        :param owner: Identifier of the leasing worker
+        :type owner: str
+        :param lease_seconds: New lease length from now, defaults to 600.0
+        :type lease_seconds: float, optional
+        :return: False if the lease was lost to another worker
+        :rtype: bool
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE items SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, item_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def ack(self, item_id: int, owner: str, jobid: int) -> bool:
+        """Marks a leased item as solved
+
+        :param item_id: ID of the item
+        :type item_id: int
+        :param owner: Identifier of the leasing worker
+        :type owner: str
+        :param jobid: Resulting job ID
+        :type jobid: int
+        :return: False if the lease was lost to another worker
+        :rtype: bool
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE items SET state = 'done', jobid = ?, error = NULL, lease_owner = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (jobid, time.time(), item_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def nack(self, item_id: int, owner: str, error: str = "") -> bool:
+        """Gives a leased item back after a failure
+
+        The item is requeued until it has used up ``max_attempts``, then it is marked failed.
+
+        :param item_id: ID of the item
+        :type item_id: int
+        :param owner: Identifier of the leasing worker
+        :type owner: str
+        :param error: Reason of the failure, defaults to ""
+        :type error: str, optional
+        :return: False if the lease was lost to another worker
+        :rtype: bool
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (self.max_attempts, error, time.time(), item_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def fail(self, item_id: int, owner: str, error: str = "") -> bool:
+        """Marks a leased item failed without retrying it, i.e. when the image cannot be solved
+
+        :param item_id: ID of the item
+        :type item_id: int
+        :param owner: Identifier of the leasing worker
+        :type owner: str
+        :param error: Reason of the failure, defaults to ""
+        :type error: str, optional
+        :return: False if the lease was lost to another worker
+        :rtype: bool
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE items SET state = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (error, time.time(), item_id, owner)
+            )
+            return cur.rowcount == 1
+
+    def stats(self) -> Dict[str, int]:
+        """Counts items per state
+
+        :return: Mapping of state to number of items
+        :rtype: Dict[str, int]
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+
+class _Transaction:
+    """Runs the statements of a ``with`` block in one ``BEGIN IMMEDIATE`` transaction
+    and closes the connection afterwards."""
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
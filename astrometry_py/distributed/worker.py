@@ -0,0 +1,113 @@
+import os
+import socket
+import asyncio
+import logging
+from typing import List, Sequence
+
+from ..core.jobs import JobManager
+from ..exceptions import SolveFailedError
+from .queue import SQLiteWorkQueue, WorkItem
+
+logger = logging.getLogger(__name__)
+
+
+class QueueWorker:
+    """Consumes a shared work queue with one or more JobManagers.
+
+    Each manager normally wraps a client with its own API key; every leased
+    item goes to the manager with the fewest jobs in flight, which spreads
+    the load (and the per-key rate limit) across all keys. Leases are renewed
+    while a job is running and acknowledged with the resulting job ID; images
+    that cannot be solved are marked failed at once, other errors are retried.
+    """
+    def __init__(
+        self,
+        queue: SQLiteWorkQueue,
+        managers: Sequence[JobManager],
+        worker_id: str | None = None,
+        concurrency: int = 4,
+        lease_seconds: float = 600.0,
+        idle_interval: float = 2.0
+    ):
+        """Initializes the worker
+
+        :param queue: Shared work queue
+        :type queue: SQLiteWorkQueue
+        :param managers: Job managers to spread the work over (i.e. one per API key)
+        :type managers: Sequence[JobManager]
+        :param worker_id: Lease owner name, defaults to "<hostname>:<pid>"
+        :type worker_id: str, optional
+        :param concurrency: Items processed at once by this worker, defaults to 4
+        :type concurrency: int, optional
+        :param lease_seconds: Lease length; renewed every third of it, defaults to 600.0
+        :type lease_seconds: float, optional
+        :param idle_interval: Seconds to wait when the queue is empty, defaults to 2.0
+        :type idle_interval: float, optional
+        :raises ValueError: if no managers are given
+        """
+        if not managers:
+            raise ValueError("QueueWorker needs at least one JobManager")
+        self.queue = queue
+        self.managers: List[JobManager] = list(managers)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.idle_interval = idle_interval
+        self._in_flight = [0] * len(self.managers)
+
+    def _pick_manager(self) -> int:
+        return min(range(len(self.managers)), key=self._in_flight.__getitem__)
+
+    async def _keep_alive(self, item: WorkItem) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.renew, item.id, self.worker_id, self.lease_seconds):
+                logger.warning("Lost lease on item %d (%s)", item.id, item.path)
+                return
+
+    async def process(self, item: WorkItem) -> None:
+        """Solves one leased item and acknowledges it
+
+        :param item: The leased item
+        :type item: WorkItem
+        """
+        index = self._pick_manager()
+        self._in_flight[index] += 1
+        heartbeat = asyncio.create_task(self._keep_alive(item))
+        try:
+            jobid = await self.managers[index].process_job(item.path, priority=item.priority, **item.params)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.queue.nack, item.id, self.worker_id, "worker stopped")
+            raise
+        except SolveFailedError as e:
+            # the image itself cannot be solved, another attempt would fail the same way
+            logger.error("Item %d (%s) could not be solved: %s", item.id, item.path, e)
+            await asyncio.to_thread(self.queue.fail, item.id, self.worker_id, str(e))
+        except Exception as e:
+            logger.error("Item %d (%s) failed: %s", item.id, item.path, e)
+            await asyncio.to_thread(self.queue.nack, item.id, self.worker_id, str(e))
+        else:
+            logger.info("Item %d (%s) solved as job %s", item.id, item.path, jobid)
+            await asyncio.to_thread(self.queue.ack, item.id, self.worker_id, jobid)
+        finally:
+            heartbeat.cancel()
+            self._in_flight[index] -= 1
+
+    async def _loop(self, stop_when_empty: bool) -> None:
+        while True:
+            item = await asyncio.to_thread(self.queue.lease, self.worker_id, self.lease_seconds)
+            if item is None:
+                if stop_when_empty:
+                    return
+                await asyncio.sleep(self.idle_interval)
+                continue
+            await self.process(item)
+
+    async def run(self, stop_when_empty: bool = False) -> None:
+        """Leases and processes items until cancelled
+
+        :param stop_when_empty: Return once no item is ready instead of waiting for more, defaults to False
+        :type stop_when_empty: bool, optional
+        """
+        logger.info("Worker %s starting with %d manager(s)", self.worker_id, len(self.managers))
+        await asyncio.gather(*(self._loop(stop_when_empty) for _ in range(self.concurrency)))
@@ -3,3 +3,10 @@ class AstrometryError(Exception):
     Custom exception for errors related to astrometry.net API interactions.
     """
     pass
+
+
+class SolveFailedError(AstrometryError):
+    """
+    Raised when astrometry.net finished a job without finding a solution.
+    """
+    pass
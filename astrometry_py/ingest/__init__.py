@@ -0,0 +1,2 @@
+from .watcher  import DirectoryWatcher
+from .pipeline import IngestPipeline, ResultSink, MoveSink, JsonlSink
\ No newline at end of file
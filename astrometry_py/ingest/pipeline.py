@@ -0,0 +1,137 @@
+import os
+import json
+import shutil
+import asyncio
+import logging
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List
+
+from ..core.jobs import JobManager
+from ..storage.results import ResultCache
+
+logger = logging.getLogger(__name__)
+
+Sink = Callable[[str, int], Awaitable[None]]
+
+
+class ResultSink:
+    """Downloads solved products for every job into a directory
+    """
+    def __init__(self, client, output_dir: str, file_types: Iterable[str] = ("new_fits_file",)):
+        """Initializes the sink
+
+        :param client: Client used for the downloads
+        :type client: AstrometryAPIClient
+        :param output_dir: Directory the products are written to (one subdirectory per job)
+        :type output_dir: str
+        :param file_types: Products to fetch, defaults to ("new_fits_file",)
+        :type file_types: Iterable[str], optional
+        """
+        self.client = client
+        self.cache = ResultCache(output_dir)
+        self.file_types = tuple(file_types)
+
+    async def __call__(self, image_path: str, jobid: int) -> None:
+        for file_type in self.file_types:
+            result = await self.cache.fetch(self.client, jobid, file_type)
+            logger.info("Saved %s for %s to %s", file_type, image_path, result.path)
+
+
+class MoveSink:
+    """Moves ingested source frames out of the drop directory
+    """
+    def __init__(self, dest_dir: str):
+        """Initializes the sink
+
+        :param dest_dir: Directory processed frames are moved to
+        :type dest_dir: str
+        """
+        self.dest_dir = os.path.expanduser(dest_dir)
+
+    async def __call__(self, image_path: str, jobid: int) -> None:
+        os.makedirs(self.dest_dir, exist_ok=True)
+        await asyncio.to_thread(shutil.move, image_path, os.path.join(self.dest_dir, os.path.basename(image_path)))
+
+
+class JsonlSink:
+    """Appends one ``{"path": ..., "jobid": ...}`` line per solved frame to a file
+    """
+    def __init__(self, path: str):
+        """Initializes the sink
+
+        :param path: File to append to
+        :type path: str
+        """
+        self.path = os.path.expanduser(path)
+
+    async def __call__(self, image_path: str, jobid: int) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"path": image_path, "jobid": jobid}) + "\n")
+
+
+class IngestPipeline:
+    """Feeds new files from a source into a JobManager through a bounded queue.
+
+    When all workers are busy and the queue is full the source is no longer
+    read, so a burst of frames backs up on disk rather than in memory.
+    """
+    def __init__(
+        self,
+        manager: JobManager,
+        source: AsyncIterable[str],
+        sinks: Iterable[Sink] = (),
+        workers: int = 4,
+        queue_size: int = 64
+    ):
+        """Initializes the pipeline
+
+        :param manager: Job manager used to solve frames
+        :type manager: JobManager
+        :param source: Async iterable of file paths, i.e. a DirectoryWatcher
+        :type source: AsyncIterable[str]
+        :param sinks: Async callables run as ``sink(image_path, jobid)`` after each solve, defaults to ()
+        :type sinks: Iterable[Sink], optional
+        :param workers: Number of frames solved concurrently, defaults to 4
+        :type workers: int, optional
+        :param queue_size: Maximum number of frames waiting for a worker, defaults to 64
+        :type queue_size: int, optional
+        """
+        self.manager = manager
+        self.source = source
+        self.sinks: List[Sink] = list(sinks)
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.solved = 0
+        self.failed = 0
+
+    async def _feed(self) -> None:
+        async for path in self.source:
+            await self.queue.put(path)
+
+    async def _work(self) -> None:
+        while True:
+            path = await self.queue.get()
+            try:
+                jobid = await self.manager.process_job(path)
+                self.solved += 1
+                for sink in self.sinks:
+                    await sink(path, jobid)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error("Ingest of %s failed: %s", path, e)
+            finally:
+                self.queue.task_done()
+
+    async def run(self) -> None:
+        """Runs until the source is exhausted and the queue is drained, or until cancelled
+        """
+        workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        try:
+            await self._feed()
+            await self.queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            logger.info("Ingest stopped: %d solved, %d failed", self.solved, self.failed)
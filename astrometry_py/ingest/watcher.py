@@ -0,0 +1,227 @@
+import os
+import stat
+import time
+import asyncio
+import fnmatch
+import logging
+from typing import AsyncIterator, Dict, Iterable, Tuple
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS = ("*.fits", "*.fit", "*.fts", "*.jpg", "*.jpeg", "*.png", "*.tif", "*.tiff")
+
+
+class DirectoryWatcher:
+    """Watches drop directories and yields files once they have stopped changing.
+
+    Uses inotify when ``inotify_simple`` is installed (Linux) and falls back to
+    polling otherwise. Either way a file is only handed out after its size and
+    mtime have been stable for ``settle_time`` seconds, so half-written frames
+    are never picked up.
+    """
+    def __init__(
+        self,
+        directories: Iterable[str],
+        patterns: Iterable[str] = DEFAULT_PATTERNS,
+        settle_time: float = 1.0,
+        poll_interval: float = 2.0,
+        include_existing: bool = False,
+        use_inotify: bool | None = None
+    ):
+        """Initializes the watcher
+
+        :param directories: Directories to watch
+        :type directories: Iterable[str]
+        :param patterns: Filename globs to accept, defaults to common image types
+        :type patterns: Iterable[str], optional
+        :param settle_time: Seconds a file must stay unchanged before it is yielded, defaults to 1.0
+        :type settle_time: float, optional
+        :param poll_interval: Seconds between scans in polling mode, defaults to 2.0
+        :type poll_interval: float, optional
+        :param include_existing: Also yield files already present at start, defaults to False
+        :type include_existing: bool, optional
+        :param use_inotify: Force inotify on/off; None picks it when available
+        :type use_inotify: bool, optional
+        :raises RuntimeError: if inotify is requested but not available
+        """
+        self.directories = [os.path.abspath(os.path.expanduser(d)) for d in directories]
+        self.patterns = tuple(patterns)
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.include_existing = include_existing
+        if use_inotify is None:
+            use_inotify = INotify is not None
+        if use_inotify and INotify is None:
+            raise RuntimeError("inotify support requires the inotify_simple package")
+        self.use_inotify = use_inotify
+
+        # path -> (st_ino, st_mtime) of the version already handed out
+        self._seen: Dict[str, Tuple[int, float]] = {}
+        # path -> (size, mtime, time of last observed change)
+        self._pending: Dict[str, Tuple[int, float, float]] = {}
+        self._wake: asyncio.Event | None = None
+
+    def _matches(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return not name.startswith(".") and any(fnmatch.fnmatch(name.lower(), p) for p in self.patterns)
+
+    def _scan(self) -> Iterable[str]:
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_file() and self._matches(entry.path):
+                            yield entry.path
+            except FileNotFoundError:
+                logger.warning("Watched directory %s does not exist", directory)
+
+    def _candidate(self, path: str) -> None:
+        if path in self._pending or not self._matches(path):
+            return
+        if path in self._seen:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._seen[path]
+                return
+            if self._seen[path] == (st.st_ino, st.st_mtime):
+                return
+            # a new file was written under a name we already handed out
+            del self._seen[path]
+        self._pending[path] = (-1, -1.0, time.monotonic())
+
+    def _rescan(self) -> None:
+        """Polling mode: picks up new files and forgets the ones that are gone"""
+        present = set()
+        for path in self._scan():
+            present.add(path)
+            self._candidate(path)
+        for path in self._seen.keys() - present:
+            del self._seen[path]
+
+    def _start_inotify(self):
+        inotify = INotify()
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE | flags.MOVED_FROM
+        watches = {inotify.add_watch(d, mask): d for d in self.directories}
+
+        def on_readable():
+            for event in inotify.read(timeout=0):
+                if event.mask & flags.Q_OVERFLOW:
+                    # the kernel dropped events, so files may have arrived unnoticed
+                    logger.warning("inotify queue overflowed, rescanning %s", ", ".join(self.directories))
+                    self._rescan()
+                    continue
+                directory = watches.get(event.wd)
+                if not (directory and event.name):
+                    continue
+                path = os.path.join(directory, event.name)
+                if event.mask & (flags.DELETE | flags.MOVED_FROM):
+                    self._seen.pop(path, None)
+                else:
+                    self._candidate(path)
+            self._wake.set()
+
+        asyncio.get_running_loop().add_reader(inotify.fileno(), on_readable)
+        return inotify
+
+    def _check_pending(self) -> list:
+        """Returns (path, stat) of pending files that have settled and forgets vanished ones"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, changed) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                # i.e. a directory whose name matches a pattern
+                del self._pending[path]
+                continue
+            if (st.st_size, st.st_mtime) != (size, mtime):
+                self._pending[path] = (st.st_size, st.st_mtime, now)
+            elif now - changed >= self.settle_time:
+                del self._pending[path]
+                ready.append((path, st))
+        return ready
+
+    def _claim(self, path: str, settled: os.stat_result) -> bool:
+        """Checks a settled file again right before it is handed out and marks it seen
+
+        The consumer may take a while over earlier files, so the file can be
+        gone or rewritten by now; a rewritten file has to settle again.
+        """
+        if path in self._pending:
+            # an inotify event arrived for it in the meantime
+            return False
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if (st.st_ino, st.st_size, st.st_mtime) != (settled.st_ino, settled.st_size, settled.st_mtime):
+            self._pending[path] = (st.st_size, st.st_mtime, time.monotonic())
+            return False
+        self._seen[path] = (st.st_ino, st.st_mtime)
+        return True
+
+    async def watch(self) -> AsyncIterator[str]:
+        """Yields the paths of new, fully written files
+
+        A slow consumer only leaves files waiting on disk: in polling mode
+        nothing is scanned while the consumer is not asking for the next
+        file, and with inotify incoming events only add paths to the pending
+        set, which holds each file at most once. Every file is checked again
+        right before it is yielded.
+
+        :return: Async iterator of file paths
+        :rtype: AsyncIterator[str]
+        """
+        self._wake = asyncio.Event()
+        for path in self._scan():
+            if self.include_existing:
+                self._candidate(path)
+            else:
+                st = os.stat(path)
+                self._seen[path] = (st.st_ino, st.st_mtime)
+
+        inotify = None
+        if self.use_inotify:
+            logger.info("Watching %s with inotify", ", ".join(self.directories))
+            inotify = self._start_inotify()
+        else:
+            logger.info("Polling %s every %.1fs", ", ".join(self.directories), self.poll_interval)
+
+        tick = max(self.settle_time / 2, 0.05)
+        next_scan = time.monotonic() + self.poll_interval
+        try:
+            while True:
+                for path, settled in self._check_pending():
+                    if self._claim(path, settled):
+                        logger.debug("New file ready: %s", path)
+                        yield path
+
+                timeout = tick if self._pending else None
+                if inotify is None:
+                    now = time.monotonic()
+                    if now >= next_scan:
+                        self._rescan()
+                        next_scan = now + self.poll_interval
+                        continue
+                    timeout = min(timeout or self.poll_interval, next_scan - now)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            if inotify is not None:
+                asyncio.get_running_loop().remove_reader(inotify.fileno())
+                inotify.close()
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self.watch()
@@ -1,3 +1,22 @@
+import importlib
+
 # from .cache import *
-from .decorators import *
-# from .decorators import file_cache
\ No newline at end of file
+_LAZY = {
+    "hash_cache":         ".decorators",
+    "compute_key":        ".decorators",
+    "ResultCache":        ".results",
+    "ResultFile":         ".results",
+    "rgb_view":           ".results",
+    "SkyIndex":           ".skyindex",
+    "angular_separation": ".skyindex",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
\ No newline at end of file
@@ -1,90 +1,260 @@
 import functools
 import os
+import time
+import pickle
+import sqlite3
 import hashlib
-import shelve
 import asyncio
+import inspect
 import logging
-import threading
+import contextlib
 
-def hash_cache(fn=None, *, path_index: int = 1):
-    """_summary_
+from ..exceptions import AstrometryError
 
-    :param fn: _description_, defaults to None
-    :type fn: _type_, optional
-    :param path_index: _description_, defaults to 1
+# marks the layout of stored entries; entries of another version are treated as misses
+_ENTRY_VERSION = 2
+
+def compute_key(file_path: str) -> str:
+    """SHA-256 of a file's contents
+
+    Defined at module level so it can be shipped to a process pool.
+
+    :param file_path: Path to the file
+    :type file_path: str
+    :return: Hex digest
+    :rtype: str
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _picklable(exc: BaseException) -> BaseException:
+    try:
+        pickle.loads(pickle.dumps(exc))
+        return exc
+    except Exception:
+        return AstrometryError(f"{type(exc).__name__}: {exc}")
+
+def hash_cache(
+    fn=None,
+    *,
+    path_index: int = 1,
+    ttl: float | None = None,
+    error_ttl: float = 300.0,
+    cache_errors: tuple = (),
+    hash_runner=None
+):
+    """Caches a function's result by the contents of one of its file arguments.
+
+    Entries are kept in one SQLite file per function under
+    ``~/.cache/hash_cache``. Every read and write is a single statement, so
+    several processes (i.e. queue workers on one host, or on hosts sharing
+    an NFS home) can use the same cache safely.
+
+    For coroutine functions the cache is asyncio-aware: hashing runs in the
+    loop's default pool, or through ``hash_runner`` if given, database I/O
+    runs in a thread, and concurrent calls for the same file wait on a
+    per-key lock so only one of them actually executes. Exceptions listed in
+    ``cache_errors`` are cached too, for ``error_ttl`` seconds, and re-raised
+    on a hit.
+
+    The wrapper gets ``invalidate(file_path=None)``, ``lookup(file_path)``
+    and ``stats()`` helpers.
+
+    :param fn: Function to wrap, defaults to None (for use with arguments)
+    :type fn: Callable, optional
+    :param path_index: Index of the positional argument holding the file path, defaults to 1
     :type path_index: int, optional
-    :raises TypeError: _description_
-    :raises TypeError: _description_
-    :return: _description_
-    :rtype: _type_
+    :param ttl: Seconds a successful result stays valid, defaults to None (forever)
+    :type ttl: float, optional
+    :param error_ttl: Seconds a cached failure stays valid, defaults to 300.0
+    :type error_ttl: float, optional
+    :param cache_errors: Exception types that are cached as failures, defaults to ()
+    :type cache_errors: tuple, optional
+    :param hash_runner: Coroutine functions only: gets the call's arguments by parameter
+        name (defaults applied) and returns an async ``run(fn, *args)`` to hash with,
+        defaults to None (the loop's default pool)
+    :type hash_runner: Callable[[Dict[str, Any]], Callable[..., Awaitable[str]]], optional
+    :raises TypeError: if the path argument is missing, or hash_runner is given for a plain function
+    :return: The wrapped function
+    :rtype: Callable
     """
     # Allow decorator without args
     if fn is None:
-        return lambda f: hash_cache(f, path_index=path_index)
+        return lambda f: hash_cache(
+            f, path_index=path_index, ttl=ttl, error_ttl=error_ttl, cache_errors=cache_errors,
+            hash_runner=hash_runner
+        )
 
     cache_dir = os.path.expanduser("~/.cache/hash_cache")
-    os.makedirs(cache_dir, exist_ok=True)
-    db_path = os.path.join(cache_dir, f"{fn.__name__}.db")
-    lock = threading.RLock()
+    db_path = os.path.join(cache_dir, f"{fn.__name__}.sqlite")
     logger = logging.getLogger(fn.__module__)
+    counters = {"hits": 0, "negative_hits": 0, "misses": 0, "errors_cached": 0, "saved_seconds": 0.0}
+
+    def connect() -> sqlite3.Connection:
+        # created on first use rather than when the decorated module is imported
+        os.makedirs(cache_dir, exist_ok=True)
+        # autocommit, so each statement is its own transaction; the rollback
+        # journal (not WAL) also works on network file systems
+        conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, entry BLOB NOT NULL)")
+        return conn
+
+    def get_path(args) -> str:
+        try:
+            return os.fspath(args[path_index])
+        except IndexError:
+            raise TypeError(f"hash_cache needs argument at index {path_index}")
+
+    def read(key: str) -> dict | None:
+        with contextlib.closing(connect()) as conn:
+            row = conn.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = pickle.loads(row[0])
+        if not (isinstance(entry, dict) and entry.get("version") == _ENTRY_VERSION):
+            return None
+        limit = ttl if entry["ok"] else error_ttl
+        if limit is not None and time.time() - entry["created"] > limit:
+            return None
+        return entry
+
+    def write(key: str, entry: dict) -> None:
+        with contextlib.closing(connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, entry) VALUES (?, ?)", (key, pickle.dumps(entry)))
+
+    def make_entry(file_path: str, started: float, value=None, error: BaseException | None = None) -> dict:
+        return {
+            "version": _ENTRY_VERSION,
+            "ok": error is None,
+            "value": value,
+            "error": _picklable(error) if error is not None else None,
+            "created": time.time(),
+            "elapsed": time.monotonic() - started,
+            "size": os.path.getsize(file_path),
+        }
+
+    def use(entry: dict, file_path: str):
+        counters["saved_seconds"] += entry["elapsed"] or 0.0
+        if entry["ok"]:
+            counters["hits"] += 1
+            logger.debug("hash_cache hit for %s", file_path)
+            return entry["value"]
+        counters["negative_hits"] += 1
+        logger.debug("hash_cache negative hit for %s", file_path)
+        raise entry["error"]
+
+    def invalidate(file_path: str | None = None) -> int:
+        """Drops the entry for one file, or the whole cache
 
-    def compute_key(file_path: str) -> str:
-        hasher = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        :param file_path: File whose entry to drop, defaults to None (everything)
+        :type file_path: str, optional
+        :return: Number of entries removed
+        :rtype: int
+        """
+        with contextlib.closing(connect()) as conn:
+            if file_path is None:
+                return conn.execute("DELETE FROM entries").rowcount
+            key = compute_key(os.fspath(file_path))
+            return conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+
+    def lookup(file_path: str) -> dict | None:
+        """Gets the metadata of a file's cache entry without using it
+
+        :param file_path: File to look up
+        :type file_path: str
+        :return: ok, created, elapsed (seconds the call took) and size (bytes), or None
+        :rtype: dict | None
+        """
+        entry = read(compute_key(os.fspath(file_path)))
+        if entry is None:
+            return None
+        return {k: entry[k] for k in ("ok", "created", "elapsed", "size")}
+
+    def stats() -> dict:
+        """Gets hit/miss counters of this process and the number of stored entries
+
+        :return: hits, negative_hits, misses, errors_cached, saved_seconds and entries
+        :rtype: dict
+        """
+        with contextlib.closing(connect()) as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {**counters, "entries": entries}
 
     # Async wrapper
     if asyncio.iscoroutinefunction(fn):
+        signature = inspect.signature(fn)
+        key_locks: dict[str, asyncio.Lock] = {}
+        key_users: dict[str, int] = {}
+
         @functools.wraps(fn)
         async def async_wrapper(*args, **kwargs):
-            try:
-                file_path = os.fspath(args[path_index])
-            except IndexError:
-                raise TypeError(f"hash_cache needs argument at index {path_index}")
-            key = compute_key(file_path)
-
-            # Attempt cache read
-            with lock:
-                with shelve.open(db_path, writeback=False) as shelf:
-                    if key in shelf:
-                        logger.debug("hash_cache hit for %s", file_path)
-                        return shelf[key]
-
-            # Cache miss: call function
-            result = await fn(*args, **kwargs)
-
-            # Persist result
-            with lock:
-                with shelve.open(db_path, writeback=False) as shelf:
-                    shelf[key] = result
+            file_path = get_path(args)
+            # hash off the event loop
+            if hash_runner is not None:
+                call = signature.bind(*args, **kwargs)
+                call.apply_defaults()
+                key = await hash_runner(call.arguments)(compute_key, file_path)
+            else:
+                key = await asyncio.get_running_loop().run_in_executor(None, compute_key, file_path)
 
-            return result
+            # one caller per key runs fn, the others wait and then hit the cache
+            key_lock = key_locks.setdefault(key, asyncio.Lock())
+            key_users[key] = key_users.get(key, 0) + 1
+            try:
+                async with key_lock:
+                    entry = await asyncio.to_thread(read, key)
+                    if entry is not None:
+                        return use(entry, file_path)
 
-        return async_wrapper
+                    counters["misses"] += 1
+                    started = time.monotonic()
+                    try:
+                        result = await fn(*args, **kwargs)
+                    except cache_errors as e:
+                        counters["errors_cached"] += 1
+                        await asyncio.to_thread(write, key, make_entry(file_path, started, error=e))
+                        raise
+                    await asyncio.to_thread(write, key, make_entry(file_path, started, value=result))
+                    return result
+            finally:
+                key_users[key] -= 1
+                if not key_users[key]:
+                    del key_users[key]
+                    del key_locks[key]
 
-    # Sync wrapper
-    @functools.wraps(fn)
-    def sync_wrapper(*args, **kwargs):
-        try:
-            file_path = os.fspath(args[path_index])
-        except IndexError:
-            raise TypeError(f"hash_cache needs argument at index {path_index}")
-        key = compute_key(file_path)
+        wrapper = async_wrapper
+    else:
+        if hash_runner is not None:
+            raise TypeError("hash_runner is only supported for coroutine functions")
 
-        with lock:
-            with shelve.open(db_path, writeback=False) as shelf:
-                if key in shelf:
-                    logger.debug("hash_cache hit for %s", file_path)
-                    return shelf[key]
+        # Sync wrapper
+        @functools.wraps(fn)
+        def sync_wrapper(*args, **kwargs):
+            file_path = get_path(args)
+            key = compute_key(file_path)
 
-        result = fn(*args, **kwargs)
+            entry = read(key)
+            if entry is not None:
+                return use(entry, file_path)
 
-        with lock:
-            with shelve.open(db_path, writeback=False) as shelf:
-                shelf[key] = result
+            counters["misses"] += 1
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except cache_errors as e:
+                counters["errors_cached"] += 1
+                write(key, make_entry(file_path, started, error=e))
+                raise
+            write(key, make_entry(file_path, started, value=result))
+            return result
 
-        return result
+        wrapper = sync_wrapper
 
-    return sync_wrapper
\ No newline at end of file
+    wrapper.invalidate = invalidate
+    wrapper.lookup = lookup
+    wrapper.stats = stats
+    return wrapper
@@ -0,0 +1,183 @@
+import os
+import asyncio
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_DIR = "~/.cache/astrometry_py/results"
+FITS_PRODUCTS = {"new_fits_file", "wcs_file", "rdls_file", "axy_file", "corr_file"}
+
+
+def rgb_view(data):
+    """Returns a channel-last view of a channel-first (C, H, W) image.
+
+    No pixel data is copied, so this is safe to call on memory-mapped arrays.
+
+    :param data: Image array with 3 or 4 leading colour planes
+    :type data: numpy.ndarray
+    :raises ValueError: if the array is not a (3|4, H, W) cube
+    :return: (H, W, C) view of ``data``
+    :rtype: numpy.ndarray
+    """
+    import numpy as np
+
+    if data.ndim != 3 or data.shape[0] not in (3, 4):
+        raise ValueError(f"Expected a (3|4, H, W) image, got shape {data.shape}")
+    return np.moveaxis(data, 0, -1)
+
+
+class ResultFile:
+    """A solved product on disk with lazily loaded, memory-mapped HDUs.
+
+    Nothing is read until :attr:`header` or :attr:`data` is accessed, and
+    the pixel data is backed by the file rather than loaded into RAM. The
+    exception is scaled data (``BZERO``/``BSCALE`` headers, i.e. unsigned
+    16-bit frames): astropy applies the scaling to an in-memory copy unless
+    ``do_not_scale_image_data`` is set, which returns the raw stored values.
+    """
+    def __init__(
+        self,
+        path: str,
+        hdu: int = 0,
+        ignore_missing_simple: bool = False,
+        do_not_scale_image_data: bool = False
+    ):
+        """Initializes a ResultFile
+
+        :param path: Path to the FITS file
+        :type path: str
+        :param hdu: Index of the HDU to expose, defaults to 0
+        :type hdu: int, optional
+        :param ignore_missing_simple: Accept files without a SIMPLE card (i.e. some camera output), defaults to False
+        :type ignore_missing_simple: bool, optional
+        :param do_not_scale_image_data: Keep the stored values instead of applying BZERO/BSCALE, defaults to False
+        :type do_not_scale_image_data: bool, optional
+        """
+        self.path = path
+        self.hdu = hdu
+        self.ignore_missing_simple = ignore_missing_simple
+        self.do_not_scale_image_data = do_not_scale_image_data
+        self._hdul = None
+
+    @property
+    def hdul(self):
+        """The opened HDU list (opened on first access).
+
+        :rtype: astropy.io.fits.HDUList
+        """
+        if self._hdul is None:
+            from astropy.io import fits
+
+            logger.debug("Memory-mapping %s", self.path)
+            # astropy memory-maps by default; memmap=True would make it refuse scaled data
+            # instead of copying it
+            self._hdul = fits.open(
+                self.path,
+                lazy_load_hdus=True,
+                ignore_missing_simple=self.ignore_missing_simple,
+                do_not_scale_image_data=self.do_not_scale_image_data
+            )
+        return self._hdul
+
+    @property
+    def header(self):
+        """Header of the selected HDU
+
+        :rtype: astropy.io.fits.Header
+        """
+        return self.hdul[self.hdu].header
+
+    @property
+    def data(self):
+        """Memory-mapped pixel data of the selected HDU (a copy if it is scaled)
+
+        :rtype: numpy.ndarray
+        """
+        return self.hdul[self.hdu].data
+
+    def rgb(self):
+        """Channel-last view of the data for plotting (no copy)
+
+        :return: (H, W, C) view, or the 2-D data unchanged for mono frames
+        :rtype: numpy.ndarray
+        """
+        data = self.data
+        if data.ndim == 2:
+            return data
+        return rgb_view(data)
+
+    def close(self) -> None:
+        """Closes the underlying file and releases the memory map
+        """
+        if self._hdul is not None:
+            self._hdul.close()
+            self._hdul = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultCache:
+    """Keeps solved products in a cache directory so they are downloaded once
+    and then opened from disk.
+    """
+    def __init__(self, cache_dir: str = DEFAULT_RESULT_DIR):
+        """Initializes the result cache
+
+        :param cache_dir: Directory for downloaded products, defaults to "~/.cache/astrometry_py/results"
+        :type cache_dir: str, optional
+        """
+        self.cache_dir = os.path.expanduser(cache_dir)
+        # path -> (lock, number of fetches using it)
+        self._downloads: Dict[str, list] = {}
+
+    def path_for(self, jobid: int, file_type: str) -> str:
+        """Gets the on-disk location of a product
+
+        :param jobid: ID of the job
+        :type jobid: int
+        :param file_type: type of file (i.e. new_fits_file)
+        :type file_type: str
+        :return: File path
+        :rtype: str
+        """
+        ext = ".fits" if file_type in FITS_PRODUCTS else ""
+        return os.path.join(self.cache_dir, str(jobid), file_type + ext)
+
+    async def fetch(self, client, jobid: int, file_type: str = "new_fits_file", **options) -> ResultFile:
+        """Downloads a product if it is not cached yet and opens it lazily
+
+        Concurrent fetches of the same product share a single download.
+
+        :param client: Client used for the download
+        :type client: AstrometryAPIClient
+        :param jobid: ID of the job
+        :type jobid: int
+        :param file_type: type of file, defaults to "new_fits_file"
+        :type file_type: str, optional
+        :param options: Keyword arguments for :class:`ResultFile` (i.e. ``do_not_scale_image_data``)
+        :return: Lazily opened result
+        :rtype: ResultFile
+        """
+        path = self.path_for(jobid, file_type)
+        if os.path.exists(path):
+            logger.debug("Result cache hit for %s", path)
+            return ResultFile(path, **options)
+
+        download = self._downloads.setdefault(path, [asyncio.Lock(), 0])
+        download[1] += 1
+        try:
+            async with download[0]:
+                # another fetch may have finished the download while this one waited
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    await client.download_result(jobid, file_type, path)
+        finally:
+            download[1] -= 1
+            if not download[1]:
+                del self._downloads[path]
+        return ResultFile(path, **options)
@@ -0,0 +1,184 @@
+import os
+import math
+import shelve
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "~/.cache/astrometry_py/skyindex.db"
+
+
+def angular_separation(ra1: float, dec1: float, ra2: float, dec2: float) -> float:
+    """Great-circle distance between two sky positions (haversine)
+
+    :param ra1: Right ascension of the first point in degrees
+    :type ra1: float
+    :param dec1: Declination of the first point in degrees
+    :type dec1: float
+    :param ra2: Right ascension of the second point in degrees
+    :type ra2: float
+    :param dec2: Declination of the second point in degrees
+    :type dec2: float
+    :return: Separation in degrees
+    :rtype: float
+    """
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    h = (math.sin((dec2 - dec1) / 2) ** 2
+         + math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2)
+    return math.degrees(2 * math.asin(min(1.0, math.sqrt(h))))
+
+
+class SkyIndex:
+    """Persistent spatial index of previous solutions.
+
+    Solutions are bucketed on an equal-area-ish RA/Dec grid: declination is
+    split into bands of ``cell_deg`` and each band into as many RA cells as
+    fit at that declination, so a lookup only has to look at the handful of
+    cells around the requested position.
+
+    An entry holds the calibration summary of the job info (centre, radius,
+    pixel scale, orientation, parity), which is all :meth:`hints` needs.
+    The full WCS is only stored when the caller passes it to :meth:`add`;
+    :class:`JobManager` does not, to avoid downloading ``wcs_file`` for every
+    job.
+    """
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, cell_deg: float = 2.0):
+        """Initializes the index and loads any stored solutions
+
+        :param path: Shelve file holding the solutions, defaults to "~/.cache/astrometry_py/skyindex.db"
+        :type path: str, optional
+        :param cell_deg: Size of a grid cell in degrees, defaults to 2.0
+        :type cell_deg: float, optional
+        """
+        self.path = os.path.expanduser(path)
+        self.cell_deg = cell_deg
+        self._n_bands = int(math.ceil(180.0 / cell_deg))
+        # _lock guards the in-memory grid, _write_lock the shelve file, so
+        # lookups never wait for disk I/O
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._cells: Dict[tuple, Dict[int, Dict[str, Any]]] = {}
+        self._max_radius = 0.0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with shelve.open(self.path) as shelf:
+            for entry in shelf.values():
+                self._insert(entry)
+        logger.debug("Loaded %d solutions from %s", len(self), self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(cell) for cell in self._cells.values())
+
+    def _band(self, dec: float) -> int:
+        return min(self._n_bands - 1, int((dec + 90.0) / self.cell_deg))
+
+    def _cells_in_band(self, band: int) -> int:
+        # use the band edge closest to the equator so cells never get smaller than cell_deg
+        lo = -90.0 + band * self.cell_deg
+        hi = lo + self.cell_deg
+        dec = 0.0 if lo <= 0.0 <= hi else min(abs(lo), abs(hi))
+        return max(1, int(360.0 * math.cos(math.radians(dec)) / self.cell_deg))
+
+    def _cell(self, ra: float, dec: float) -> tuple:
+        band = self._band(dec)
+        n = self._cells_in_band(band)
+        return band, int((ra % 360.0) / 360.0 * n) % n
+
+    def _insert(self, entry: Dict[str, Any]) -> None:
+        cell = self._cell(entry["ra"], entry["dec"])
+        self._cells.setdefault(cell, {})[entry["jobid"]] = entry
+        self._max_radius = max(self._max_radius, entry["radius"])
+
+    def add(self, jobid: int, calibration: Dict[str, Any], wcs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Records a solution
+
+        :param jobid: ID of the solved job
+        :type jobid: int
+        :param calibration: Calibration as returned in the job info (ra, dec, radius, pixscale, ...)
+        :type calibration: Dict[str, Any]
+        :param wcs: WCS header cards of the solution (i.e. from the wcs_file product), defaults to None
+        :type wcs: Dict[str, Any], optional
+        :return: The stored entry
+        :rtype: Dict[str, Any]
+        """
+        entry = {
+            "jobid": jobid,
+            "ra": float(calibration["ra"]),
+            "dec": float(calibration["dec"]),
+            "radius": float(calibration.get("radius", 0.0)),
+            "pixscale": calibration.get("pixscale"),
+            "orientation": calibration.get("orientation"),
+            "parity": calibration.get("parity"),
+            "wcs": wcs,
+        }
+        with self._lock:
+            self._insert(entry)
+        with self._write_lock:
+            with shelve.open(self.path) as shelf:
+                shelf[str(jobid)] = entry
+        logger.debug("Indexed job %d at ra=%.4f dec=%.4f", jobid, entry["ra"], entry["dec"])
+        return entry
+
+    def nearest(self, ra: float, dec: float, max_sep: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Finds the closest prior solution to a position
+
+        :param ra: Approximate right ascension in degrees
+        :type ra: float
+        :param dec: Approximate declination in degrees
+        :type dec: float
+        :param max_sep: Largest accepted separation in degrees; defaults to the
+            stored field radius of each candidate
+        :type max_sep: float, optional
+        :return: The closest matching entry, or None
+        :rtype: Optional[Dict[str, Any]]
+        """
+        best, best_sep = None, None
+        with self._lock:
+            reach = max_sep if max_sep is not None else self._max_radius
+            lo = self._band(max(-90.0, dec - reach))
+            hi = self._band(min(90.0, dec + reach))
+            for band in range(lo, hi + 1):
+                n = self._cells_in_band(band)
+                band_dec = min(89.9, abs(dec) + reach)
+                span = reach / math.cos(math.radians(band_dec))
+                if span >= 180.0:
+                    columns = range(n)
+                else:
+                    first = int(((ra - span) % 360.0) / 360.0 * n)
+                    width = int(math.ceil(2 * span / 360.0 * n)) + 1
+                    columns = {(first + i) % n for i in range(width)}
+                for col in columns:
+                    for entry in self._cells.get((band, col), {}).values():
+                        sep = angular_separation(ra, dec, entry["ra"], entry["dec"])
+                        limit = max_sep if max_sep is not None else entry["radius"]
+                        if sep <= limit and (best_sep is None or sep < best_sep):
+                            best, best_sep = entry, sep
+        return best
+
+    @staticmethod
+    def hints(entry: Dict[str, Any], scale_tolerance: float = 0.1) -> Dict[str, Any]:
+        """Turns a stored solution into upload hints for the solver
+
+        :param entry: Entry returned by :meth:`nearest`
+        :type entry: Dict[str, Any]
+        :param scale_tolerance: Fractional slack around the stored pixel scale, defaults to 0.1
+        :type scale_tolerance: float, optional
+        :return: Keys for the upload request-json
+        :rtype: Dict[str, Any]
+        """
+        hints = {
+            "center_ra": entry["ra"],
+            "center_dec": entry["dec"],
+            "radius": max(entry["radius"] * 2, 0.1),
+        }
+        if entry.get("pixscale"):
+            hints.update({
+                "scale_units": "arcsecperpix",
+                "scale_type": "ul",
+                "scale_lower": entry["pixscale"] * (1 - scale_tolerance),
+                "scale_upper": entry["pixscale"] * (1 + scale_tolerance),
+            })
+        return hints
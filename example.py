@@ -1,9 +1,6 @@
 import asyncio
-from astrometry_py import AstrometryAPIClient, JobManager
-from astropy.io import fits
-import numpy as np
+from astrometry_py import AstrometryAPIClient, JobManager, ResultCache
 import matplotlib.pyplot as plt
-from io import BytesIO
 
 async def main():
     client = AstrometryAPIClient("mmetbwhnrbmtyvgb")
@@ -15,20 +12,18 @@ async def main():
         # process a job with file "m104.jpg"
         jobid = await mgr.process_job("m104.jpg")
 
-        # get the solved fits and write to disk
-        resp = await client.retrieve_result(jobid, "new_fits_file")
-        with open("new_fits_file.fits", "wb") as f:
-            f.write(resp)
+        # download the solved fits into the cache dir and memory-map it
+        result = await ResultCache().fetch(client, jobid, "new_fits_file")
+        print(f"Solved fits saved to {result.path}")
 
-        data = fits.getdata(BytesIO(resp))
-
-        img_rgb = np.moveaxis(data, 0, -1)  # now (568, 960, 3)
+        img_rgb = result.rgb()  # channel-last view, now (568, 960, 3)
         plt.figure(figsize=(8, 6))
         plt.imshow(img_rgb, origin='lower')
         plt.axis('off')
         plt.title("RGB Composite from astrometry.net")
         plt.show()
-        
+        result.close()
+
     finally:
         await client.close()                   # always runs
 
@@ -10,8 +10,11 @@ setup(
     install_requires=[
         # e.g. "requests>=2.0",
     ],
+    extras_require={
+        "inotify": ["inotify_simple"],
+        "http2": ["httpx[http2]"],
+    },
     entry_points={
-        # if you want console scripts:
-        # 'console_scripts': ['proj-cli = projname.scripts:main'],
+        'console_scripts': ['astrometry-py = astrometry_py.cli:main'],
     },
 )
@@ -1,17 +1,13 @@
-import json
 import streamlit as st
 import tempfile
-from astropy.io import fits
 from astropy.wcs import WCS
 from astropy.visualization import ImageNormalize, PercentileInterval, AsinhStretch
 import matplotlib.pyplot as plt
-from io import BytesIO
 import asyncio
 import nest_asyncio
 from pathlib import Path
-import numpy as np
 
-from astrometry_py import AstrometryAPIClient, JobManager
+from astrometry_py import AstrometryAPIClient, JobManager, ResultCache, ResultFile
 
 # Patch event loop for Streamlit
 nest_asyncio.apply()
@@ -49,15 +45,7 @@ jobs = JobManager(client)
 
 # Helper to fetch annotations
 def fetch_annotations(jobid: int) -> list:
-    async def _inner():
-        url = f"{client.base_url}jobs/{jobid}/annotations/"
-        sess = await client._get_session()
-        async with sess.get(url, params={"session": client.session_id}) as resp:
-            resp.raise_for_status()
-            text = await resp.text()
-            data = json.loads(text)
-            return data.get("annotations", [])
-    return run(_inner())
+    return run(client.get_job_annotations(jobid))
 
 # 1) Login
 try:
@@ -77,9 +65,9 @@ if st.sidebar.button("▶️ Solve this image"):
 
     st.success(f"✅ Solved! Job ID: {jobid}")
 
-    # 3) Retrieve raw solved FITS with WCS headers
+    # 3) Retrieve solved FITS with WCS headers into the result cache
     try:
-        raw_solved = run(client.retrieve_result(jobid, "new_fits_file"))
+        solved = run(ResultCache().fetch(client, jobid, "new_fits_file", ignore_missing_simple=True))
     except Exception as e:
         st.error(f"🚫 Could not fetch solved FITS: {e}")
         st.stop()
@@ -94,19 +82,19 @@ if st.sidebar.button("▶️ Solve this image"):
     col1.header("Original")
     if is_fits:
         try:
-            hdul0 = fits.open(BytesIO(raw_bytes), ignore_missing_simple=True)
-            data0 = hdul0[0].data.astype(float)
-            wcs0 = WCS(hdul0[0].header, naxis=2)
-            norm0 = ImageNormalize(data0,
-                                   interval=PercentileInterval(99.5),
-                                   stretch=AsinhStretch(0.1))
-            fig0 = plt.figure(figsize=(5,5))
-            ax0 = fig0.add_subplot(1,1,1, projection=wcs0)
-            ax0.imshow(data0, norm=norm0, cmap='gray', origin='lower')
-            ax0.coords.grid(color='white', ls='dotted')
-            ax0.set_xlabel('RA')
-            ax0.set_ylabel('Dec')
-            col1.pyplot(fig0)
+            with ResultFile(tmp_path, ignore_missing_simple=True) as original:
+                data0 = original.data
+                wcs0 = WCS(original.header, naxis=2)
+                norm0 = ImageNormalize(data0,
+                                       interval=PercentileInterval(99.5),
+                                       stretch=AsinhStretch(0.1))
+                fig0 = plt.figure(figsize=(5,5))
+                ax0 = fig0.add_subplot(1,1,1, projection=wcs0)
+                ax0.imshow(data0, norm=norm0, cmap='gray', origin='lower')
+                ax0.coords.grid(color='white', ls='dotted')
+                ax0.set_xlabel('RA')
+                ax0.set_ylabel('Dec')
+                col1.pyplot(fig0)
         except Exception:
             col1.write("Could not render FITS; showing uploaded bytes.")
             col1.image(raw_bytes)
@@ -116,18 +104,10 @@ if st.sidebar.button("▶️ Solve this image"):
     # Annotated with DIY annotations
     col2.header("Annotated with WCS axes & Annotations")
     try:
-        hdul1 = fits.open(BytesIO(raw_solved), ignore_missing_simple=True)
-        data1 = hdul1[0].data
-        # # Handle 3D data (e.g., RGB planes)
-        # if data1.ndim == 3 and data1.shape[0] in (3,4):
-        #     # convert shape (C,H,W) -> (H,W,C)
-        #     rgb = np.moveaxis(data1, 0, -1)
-        #     show_data = rgb.astype(float)
-        # else:
-        #     show_data = data1.astype(float)
-        show_data = np.moveaxis(data1, 0, -1)  # now (568, 960, 3)
-
-        wcs1 = WCS(hdul1[0].header, naxis=2)
+        # channel-last view of the memory-mapped data, no copy
+        show_data = solved.rgb()  # now (568, 960, 3)
+
+        wcs1 = WCS(solved.header, naxis=2)
         norm1 = ImageNormalize(show_data,
                                interval=PercentileInterval(99.5),
                                stretch=AsinhStretch(0.1))
@@ -161,7 +141,9 @@ if st.sidebar.button("▶️ Solve this image"):
         col2.pyplot(fig1)
     except Exception as e:
         st.error(f"🚫 Could not render annotated FITS: {e}")
-        col2.image(raw_solved)
+        col2.image(solved.path)
+    finally:
+        solved.close()
 
     # 6) Close session
     try:
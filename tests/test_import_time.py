@@ -0,0 +1,40 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, home):
+    env = dict(os.environ, HOME=str(home), PYTHONPATH=ROOT)
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env, cwd=str(home), capture_output=True, text=True, check=True
+    )
+
+
+def test_import_is_lazy(tmp_path):
+    result = run_python(
+        "import sys, astrometry_py\n"
+        "print(','.join(m for m in ('aiohttp', 'shelve', 'astropy') if m in sys.modules))",
+        tmp_path
+    )
+    assert result.stdout.strip() == ""
+    # -X importtime lists every module that was imported
+    assert "aiohttp" not in result.stderr
+    assert not (tmp_path / ".cache" / "hash_cache").exists()
+
+
+def test_import_time(tmp_path):
+    stderr = run_python("import astrometry_py", tmp_path).stderr
+    # "import time: self [us] | cumulative | imported package"
+    cumulative = [int(line.split("|")[1]) for line in stderr.splitlines()
+                  if line.startswith("import time:") and line.split("|")[2].strip() == "astrometry_py"]
+    assert cumulative, stderr
+    # loose bound: the lazy package takes about a millisecond, eagerly pulling in aiohttp took hundreds
+    assert cumulative[0] < 50_000
+
+
+def test_decorating_does_not_touch_cache_dir(tmp_path):
+    run_python("import astrometry_py.core", tmp_path)
+    assert not (tmp_path / ".cache" / "hash_cache").exists()
@@ -0,0 +1,94 @@
+import json
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from astrometry_py.core import AstrometryAPIClient
+
+RESULT = b"SIMPLE  =                    T" * 100_000
+
+
+async def login(request):
+    form = await request.post()
+    return web.json_response({"status": "success", "session": "S-" + json.loads(form["request-json"])["apikey"]})
+
+
+async def upload(request):
+    form = await request.post()
+    upload = form["file"]
+    return web.json_response({
+        "status": "success",
+        "subid": 7,
+        "hints": json.loads(form["request-json"]),
+        "filename": upload.filename,
+        "size": len(upload.file.read()),
+    })
+
+
+async def submission(request):
+    return web.json_response({"jobs": [9], "job_calibrations": [[9, 1]], "session": request.query.get("session")})
+
+
+async def job(request):
+    return web.json_response({"status": "success"})
+
+
+async def result(request):
+    return web.Response(body=RESULT)
+
+
+async def start_server():
+    app = web.Application()
+    app.add_routes([
+        web.post("/api/login", login),
+        web.post("/api/upload", upload),
+        web.get("/api/submissions/{subid}", submission),
+        web.get("/api/jobs/{jobid}", job),
+        web.get("/new_fits_file/{jobid}", result),
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/api/"
+
+
+@pytest.mark.parametrize("transport", ["aiohttp", "http2"])
+def test_client_roundtrip(transport, tmp_path):
+    if transport == "http2":
+        pytest.importorskip("httpx")
+        pytest.importorskip("h2")
+    image = tmp_path / "frame.fits"
+    image.write_bytes(b"frame")
+
+    async def run():
+        runner, base_url = await start_server()
+        client = AstrometryAPIClient("KEY", base_url=base_url, transport=transport)
+        try:
+            await client.login()
+            assert client.session_id == "S-KEY"
+
+            submitted = await client.submit_job(str(image), center_ra=10.5)
+            assert submitted["subid"] == 7
+            assert submitted["hints"]["center_ra"] == 10.5
+            assert (submitted["filename"], submitted["size"]) == ("frame.fits", 5)
+
+            status = await client.check_submission_status(7)
+            assert status["jobs"] == [9] and status["session"] == "S-KEY"
+            assert (await client.get_job_status(9))["status"] == "success"
+
+            dest = tmp_path / f"{transport}.fits"
+            await client.download_result(9, "new_fits_file", str(dest))
+            assert dest.read_bytes() == RESULT
+
+            # the transport reconnects after close, like the old aiohttp session did
+            await client.close()
+            await client.login()
+            assert client.session_id == "S-KEY"
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
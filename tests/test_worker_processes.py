@@ -0,0 +1,60 @@
+import os
+import sys
+import sqlite3
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a worker process solving against a fake API, so only the queue and the hash cache are shared
+WORKER = """
+import sys, asyncio, itertools
+from astrometry_py.core import JobManager
+from astrometry_py.distributed import SQLiteWorkQueue, QueueWorker
+
+ids = itertools.count(int(sys.argv[2]) * 1000 + 1)
+
+class FakeClient:
+    async def submit_job(self, image_path, **hints):
+        await asyncio.sleep(0.001)
+        return {"subid": next(ids)}
+
+    async def check_submission_status(self, subid):
+        return {"job_calibrations": [[subid, subid]], "jobs": [subid]}
+
+    async def get_job_info(self, jobid):
+        return {}
+
+queue = SQLiteWorkQueue(sys.argv[1], max_attempts=1)
+worker = QueueWorker(queue, [JobManager(FakeClient())], worker_id=sys.argv[2], concurrency=4, idle_interval=0.01)
+asyncio.run(worker.run(stop_when_empty=True))
+"""
+
+
+def test_workers_share_queue_and_cache(tmp_path):
+    from astrometry_py.distributed import SQLiteWorkQueue
+
+    images = tmp_path / "images"
+    images.mkdir()
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.db"), max_attempts=1)
+    for i in range(200):
+        path = images / f"{i}.fits"
+        # every frame exists twice, so the workers also hit each other's cache entries
+        path.write_bytes(b"frame %d" % (i // 2))
+        queue.put(str(path))
+
+    env = dict(os.environ, HOME=str(tmp_path), PYTHONPATH=ROOT)
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, queue.path, str(n)], env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        for n in range(4)
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate(timeout=120)
+        assert worker.returncode == 0, stderr
+
+    assert queue.stats() == {"done": 200}
+    with sqlite3.connect(queue.path) as conn:
+        workers_used = conn.execute("SELECT COUNT(DISTINCT jobid / 1000) FROM items").fetchone()[0]
+    assert workers_used > 1
+    with sqlite3.connect(str(tmp_path / ".cache" / "hash_cache" / "process_job.sqlite")) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 100